@@ -23,6 +23,7 @@ Usage:
 # =====================
 
 import os
+import tempfile
 
 # =====================
 # 1: Configuración del WebDriver y Navegación
@@ -33,9 +34,33 @@ PATH_BASE = os.getcwd()
 PATH_DATA_RAW = os.path.join(PATH_BASE, "01_data/01_raw")
 PATH_DATA_PRO = os.path.join(PATH_BASE, "01_data/02_processed")
 PATH_DRIVER = os.path.join(PATH_BASE, "03_config/chromedriver/chromedriver.exe")
+PATH_LOG = os.path.join(PATH_BASE, "scraper.log")
 # Url
 URL = "https://apps5.mineco.gob.pe/transparencia/mensual/"
 
+# Patrones de URLs bloqueadas vía CDP (analítica, fuentes e imágenes)
+BLOCKED_URLS = [
+    "*google-analytics*",
+    "*doubleclick*",
+    "*.woff2",
+    "*.png",
+    "*.jpg",
+    "*.gif",
+]
+
+# Ejecutar Chrome sin interfaz gráfica
+HEADLESS = True
+
+# Nivel de logging del scraper ("DEBUG" registra cada clic y cada fila)
+LOG_LEVEL = "INFO"
+
+# Reutilización de Chrome entre ejecuciones (depuración remota + perfil persistente).
+# Los navegadores quedan abiertos al terminar; cerrarlos con
+# b_scraper.close_reused_browsers()
+REUSE_BROWSER = False
+CHROME_DEBUG_PORT = 9222  # Cada driver usa CHROME_DEBUG_PORT + id del worker
+PATH_CHROME_PROFILE = os.path.join(tempfile.gettempdir(), "camef_profile")
+
 
 # =====================
 # 2: Parámetros de Scraping
@@ -44,6 +69,9 @@ URL = "https://apps5.mineco.gob.pe/transparencia/mensual/"
 # Años de consulta
 YEARS = list(range(2019, 2023))  # no incluye el límite superior
 
+# Número de drivers en paralelo (los años se reparten entre ellos)
+MAX_WORKERS = 4
+
 
 # Selectores generales: año y frame principal
 GLOBAL_SELECTORS = {"year_dropdown": "ctl00_CPH1_DrpYear", "main_frame": "frame0"}
@@ -253,6 +281,12 @@ ROUTES = {
     },
 }
 
+# Precalcular el primer nivel de cada ruta (una sola vez)
+for _route in ROUTES.values():
+    _route["_first_level"] = min(
+        _route["levels"].keys(), key=lambda lvl: int(lvl.split("_")[1])
+    )
+
 
 # =====================
 # 3: Parámetros de Procesamiento
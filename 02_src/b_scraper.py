@@ -29,10 +29,18 @@ Usage:
 # =====================
 import sys
 import os
+import logging
+from logging.handlers import RotatingFileHandler
+import socket
+import json
+import urllib.request
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import time
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -40,27 +48,128 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import StaleElementReferenceException
-from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
 
 # Configuración desde 02_src/0_config.py
 sys.path.append(os.path.join(os.getcwd(), "02_src"))
 import a_config
 
+# Logger de rutas críticas (clics, niveles y filas); DEBUG solo si LOG_LEVEL lo indica
+logger = logging.getLogger("ws_camef")
+logger.setLevel(a_config.LOG_LEVEL)
+logger.propagate = False
+if not logger.handlers:
+    _handler = RotatingFileHandler(
+        a_config.PATH_LOG, maxBytes=5 * 1024 * 1024, backupCount=3, encoding="utf-8"
+    )
+    _handler.setFormatter(
+        logging.Formatter("%(asctime)s [%(levelname)s] %(threadName)s: %(message)s")
+    )
+    logger.addHandler(_handler)
+
+# Candado para poblar los encabezados compartidos una sola vez entre hilos
+HEADERS_LOCK = threading.Lock()
+
+# Señal compartida para detener los workers (p. ej. al presionar Ctrl+C)
+STOP_EVENT = threading.Event()
+
+# Caché de encabezados por (ruta, id de tabla): no cambian entre años.
+# Dentro de una ejecución de main() 'table_headers' ya evita re-extraerlos; la
+# caché solo se aprovecha si main() se vuelve a llamar en el mismo intérprete.
+# Las columnas de salida siguen saliendo de 'table_headers' (una lista por main()).
+HEADERS_CACHE = {}
+
 
 # =====================
 # Funciones de Utilidad
 # =====================
 
 
-def initialize_driver():
+def _wait(driver, tiempo=10):
+    """
+    Crea un WebDriverWait que consulta cada 0.1 s (por defecto son 0.5 s).
+    """
+    return WebDriverWait(driver, tiempo, poll_frequency=0.1)
+
+
+def is_port_open(port, host="127.0.0.1", tiempo=0.5):
+    """
+    Verifica si hay un proceso escuchando en el puerto indicado.
+    """
+    try:
+        with socket.create_connection((host, port), timeout=tiempo):
+            return True
+    except OSError:
+        return False
+
+
+def profile_dir(worker_id):
+    """
+    Retorna el directorio de perfil persistente de Chrome para el worker.
+    """
+    return f"{a_config.PATH_CHROME_PROFILE}_{worker_id}"
+
+
+def is_own_browser(debug_port, worker_id, tiempo=0.5):
+    """
+    Verifica que el Chrome que escucha en 'debug_port' sea el iniciado por el
+    scraper con el perfil del worker: Chrome escribe el puerto y la ruta del
+    websocket en <user-data-dir>/DevToolsActivePort, y estos deben coincidir
+    con lo que reporta /json/version.
+    """
+    if not is_port_open(debug_port):
+        return False
+
+    try:
+        with open(os.path.join(profile_dir(worker_id), "DevToolsActivePort")) as f:
+            puerto, ws_path = f.read().split()[:2]
+
+        url = f"http://127.0.0.1:{debug_port}/json/version"
+        with urllib.request.urlopen(url, timeout=tiempo) as respuesta:
+            version = json.load(respuesta)
+    except (OSError, ValueError):
+        return False
+
+    return puerto == str(debug_port) and version.get(
+        "webSocketDebuggerUrl", ""
+    ).endswith(ws_path)
+
+
+def block_urls(driver, urls):
+    """
+    Bloquea a nivel de protocolo (CDP) las URLs que coincidan con los patrones.
+    """
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": urls})
+
+
+def initialize_driver(worker_id=0):
     """
     Inicializa el driver de Selenium.
+    Si REUSE_BROWSER está activo y ya existe un Chrome del scraper escuchando
+    en el puerto de depuración del worker, se conecta a él en lugar de iniciar uno nuevo.
     """
     try:
         # Configurar el servicio del WebDriver
         service = Service(executable_path=a_config.PATH_DRIVER)
         options = webdriver.ChromeOptions()
+        # No esperar subrecursos: basta con que el DOM esté listo (se usan esperas explícitas)
+        options.page_load_strategy = "eager"
+        debug_port = a_config.CHROME_DEBUG_PORT + worker_id
+
+        if a_config.REUSE_BROWSER and is_own_browser(debug_port, worker_id):
+            # Conectarse al Chrome que quedó abierto de una ejecución anterior
+            options.add_experimental_option(
+                "debuggerAddress", f"127.0.0.1:{debug_port}"
+            )
+            driver = webdriver.Chrome(service=service, options=options)
+            driver.implicitly_wait(0)  # Solo esperas explícitas
+            block_urls(driver, a_config.BLOCKED_URLS)
+            print(f"Driver conectado a Chrome existente (puerto {debug_port}).")
+            return driver
+
+        if a_config.HEADLESS:
+            options.add_argument("--headless=new")
 
         # Opciones adicionales para estabilidad
         options.add_argument("--no-sandbox")
@@ -70,8 +179,31 @@ def initialize_driver():
             "excludeSwitches", ["enable-logging"]
         )  # Oculta notificaciones
 
+        # Desactivar recursos que no se leen (imágenes, fuentes y estilos)
+        options.add_experimental_option(
+            "prefs",
+            {
+                "profile.managed_default_content_settings.images": 2,
+                "profile.managed_default_content_settings.fonts": 2,
+                "profile.managed_default_content_settings.stylesheets": 2,
+            },
+        )
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-background-networking")
+        options.add_argument("--disable-sync")
+        options.add_argument("--disable-features=Translate")
+
+        if a_config.REUSE_BROWSER:
+            # Perfil persistente y puerto de depuración para reutilizar Chrome
+            options.add_argument(f"--remote-debugging-port={debug_port}")
+            options.add_argument(f"--user-data-dir={profile_dir(worker_id)}")
+            options.add_experimental_option("detach", True)  # Chrome sigue abierto
+
         # Inicializar el driver
         driver = webdriver.Chrome(service=service, options=options)
+        driver.implicitly_wait(0)  # Solo esperas explícitas
+        block_urls(driver, a_config.BLOCKED_URLS)
 
         # Log para confirmar que se inició correctamente
         print("Driver iniciado.")
@@ -83,12 +215,44 @@ def initialize_driver():
         raise
 
 
+def close_driver(driver):
+    """
+    Cierra el driver. Si se reutiliza Chrome, solo detiene el chromedriver
+    y deja el navegador abierto para la siguiente ejecución.
+    """
+    if a_config.REUSE_BROWSER:
+        driver.service.stop()
+    else:
+        driver.quit()
+
+
+def close_reused_browsers():
+    """
+    Cierra los Chrome que quedaron abiertos por REUSE_BROWSER (uno por worker).
+    """
+    for worker_id in range(a_config.MAX_WORKERS):
+        debug_port = a_config.CHROME_DEBUG_PORT + worker_id
+        if not is_own_browser(debug_port, worker_id):
+            continue
+
+        options = webdriver.ChromeOptions()
+        options.add_experimental_option("debuggerAddress", f"127.0.0.1:{debug_port}")
+        driver = webdriver.Chrome(
+            service=Service(executable_path=a_config.PATH_DRIVER), options=options
+        )
+        # Browser.close cierra el proceso de Chrome, no solo la sesión
+        driver.execute_cdp_cmd("Browser.close", {})
+        driver.service.stop()
+        print(f"Chrome del puerto {debug_port} cerrado.")
+
+
 def navigate_to_url(driver, url):
     """
     Navega a la URL especificada utilizando el driver proporcionado.
     """
     try:
         driver.get(url)
+        driver._current_frame = None  # La página cambió: invalidar el frame actual
         print(f"Navegando a: {url}")
 
         # cambio de frame
@@ -101,26 +265,32 @@ def navigate_to_url(driver, url):
 
 def switch_to_frame(driver, nombre_frame, tiempo=10):
     """
-    Cambia al frame especificado y verifica que el <body> esté presente
+    Cambia al frame especificado y verifica que el <body> esté presente.
+    Si el driver ya se encuentra en ese frame no hace nada.
     """
+    if getattr(driver, "_current_frame", None) == nombre_frame:
+        return
+
     try:
         # primero cambiar contenido por defecto
         driver.switch_to.default_content()
+        driver._current_frame = None
 
         # Camviar de frame
-        WebDriverWait(driver, tiempo).until(
+        _wait(driver, tiempo).until(
             EC.frame_to_be_available_and_switch_to_it((By.NAME, nombre_frame))
         )
-        print(f"Cambiado a '{nombre_frame}'.")
+        logger.debug("Cambiado a '%s'.", nombre_frame)
 
         # Verificar que el <body> del frame esté presente
-        WebDriverWait(driver, 20).until(
+        _wait(driver, 5).until(
             EC.presence_of_element_located((By.TAG_NAME, "body"))
         )
-        print("Body cargado y verificado.")
+        driver._current_frame = nombre_frame
+        logger.debug("Body cargado y verificado.")
 
     except Exception as e:
-        print(f"Error: No se pudo cargar el <body> del'{nombre_frame}'. {e}")
+        logger.error("Error: No se pudo cargar el <body> del '%s'. %s", nombre_frame, e)
 
 
 # def click_on_element(driver, element_id):
@@ -139,74 +309,106 @@ def click_on_element(driver, element_id, max_retries=3):
     """
     Hace clic en un elemento de la página (por ID) y reintenta 
     automáticamente si ocurre un StaleElementReferenceException.
+    Si el clic no se pudo realizar, propaga la excepción al llamador.
     """
-    if max_retries <= 0:
-        # Si no quedan intentos, lanza un error para detener la ejecución.
-        print(f"ERROR: Fallo al hacer clic en el elemento con ID '{element_id}' después de 3 reintentos.")
-        raise Exception("Se agotó el límite de reintentos por Stale Element.")
+    for attempt in range(max_retries):
+        # El primer intento espera hasta 10 s; los reintentos solo 2 s
+        tiempo = 10 if attempt == 0 else 2
 
-    try:
-        # 1. Espera explícita para asegurar que el elemento esté presente y se pueda hacer clic.
-        element = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.ID, element_id))
-        )
-        
-        # 2. Haz clic
-        element.click()
-        print(f"Éxito al hacer clic en el elemento con ID: {element_id}")
-        
-    except StaleElementReferenceException:
-        print(f"Advertencia: Elemento '{element_id}' obsoleto. Reintentando... (Quedan {max_retries - 1} intentos)")
-        
-        # 3. Llama a la función de nuevo con un intento menos (Recursión).
-        # Esto re-localizará el elemento.
-        click_on_element(driver, element_id, max_retries - 1)
-        
-    except TimeoutException:
-        print(f"Error: El elemento con ID '{element_id}' no se pudo hacer clic en el tiempo esperado.")
+        try:
+            # 1. Espera explícita para asegurar que el elemento esté presente y se pueda hacer clic.
+            element = _wait(driver, tiempo).until(
+                EC.element_to_be_clickable((By.ID, element_id))
+            )
+
+            # 2. Haz clic
+            element.click()
+            logger.debug("Éxito al hacer clic en el elemento con ID: %s", element_id)
+            return
+
+        except StaleElementReferenceException:
+            # 3. Reintentar: la siguiente iteración re-localizará el elemento.
+            logger.warning(
+                "Advertencia: Elemento '%s' obsoleto. Reintentando... (Quedan %s intentos)",
+                element_id, max_retries - attempt - 1,
+            )
+
+        except TimeoutException:
+            # El clic no ocurrió: propagar para que el llamador reintente o re-sincronice
+            logger.error("Error: El elemento con ID '%s' no se pudo hacer clic en el tiempo esperado.", element_id)
+            raise
+
+    # Si no quedan intentos, se propaga el error para que el llamador decida.
+    logger.error(
+        "ERROR: Fallo al hacer clic en el elemento con ID '%s' después de %s reintentos.",
+        element_id, max_retries,
+    )
+    raise StaleElementReferenceException(
+        f"Se agotó el límite de reintentos por Stale Element ('{element_id}')."
+    )
 
 
 def select_dropdown_option(driver, element_id, option_text):
     """
-    Selecciona una opción de un elemento <select> utilizando el texto de la opción
+    Selecciona una opción de un elemento <select> utilizando el valor de la opción.
+    Asigna el valor y dispara el evento 'change' en una sola llamada (JavaScript).
     """
-    try:
-        # Esperar a que el elemento <select> sea clickeable
-        select_element = WebDriverWait(driver, 20).until(
-            EC.element_to_be_clickable((By.ID, element_id))
-        )
+    # Esperar a que el elemento <select> sea clickeable
+    select_element = _wait(driver, 20).until(
+        EC.element_to_be_clickable((By.ID, element_id))
+    )
 
-        # Crear instancia de Select
-        select = Select(select_element)
-        select.select_by_value(str(option_text))
+    cambiado = driver.execute_script(
+        """
+        const s = document.getElementById(arguments[0]);
+        if (!Array.from(s.options).some(o => o.value === arguments[1])) {
+            throw new Error(`Opción no encontrada: ${arguments[1]}`);
+        }
+        if (s.value === arguments[1]) {
+            return false;
+        }
+        s.value = arguments[1];
+        s.dispatchEvent(new Event('change', {bubbles: true}));
+        return true;
+        """,
+        element_id,
+        str(option_text),
+    )
 
-    except StaleElementReferenceException:
-        select_dropdown_option(driver, element_id, option_text)
+    if cambiado:
+        # El evento 'change' recarga la página (postback): esperar a que ocurra
+        try:
+            _wait(driver, 20).until(EC.staleness_of(select_element))
+        except TimeoutException:
+            logger.warning("⚠️ La página no se recargó tras seleccionar '%s'.", option_text)
 
 
-def extract_table_data(driver):
+def extract_table_data(driver, prefix=()):
     """
-    Extrae los datos de una tabla con clase 'Data' y retorna una lista de listas
+    Extrae los datos de una tabla con clase 'Data' y retorna una lista de listas.
+    Cada fila se retorna ya precedida por los valores de 'prefix' (contexto).
     """
-    # Lista para almacenar los datos extraídos
-    datos_tabla = []
-
-    # Seleccionar todas las filas de la tabla con clase 'Data'
-    filas = driver.find_elements(By.CSS_SELECTOR, "table.Data tr[id^='tr']")
-    print(f"Se encontraron {len(filas)} filas.")
-
-    # Extraer los datos de cada fila
-    for i, fila in enumerate(filas):
-        # Extraer desde la segunda celda para omitir el botón (primer <td>)
-        datos = [td.text.strip() for td in fila.find_elements(By.TAG_NAME, "td")[1:]]
-
-        print(f"Fila {i + 1}: {datos}")
+    # Extraer todas las filas de la tabla con clase 'Data' en una sola llamada,
+    # desde la segunda celda para omitir el botón (primer <td>), descartando
+    # las filas sin contenido y anteponiendo el contexto
+    filas = driver.execute_script(
+        """
+        const prefix = arguments[0];
+        return Array.from(document.querySelectorAll("table.Data tr[id^='tr']"))
+            .map(r => Array.from(r.querySelectorAll('td')).slice(1)
+                .map(td => td.textContent.replace(/\\s+/g, ' ').trim()))
+            .filter(celdas => celdas.length)
+            .map(celdas => prefix.concat(celdas));
+        """,
+        list(prefix),
+    )
+    logger.debug("Se encontraron %s filas.", len(filas))
 
-        # Agregar datos solo si la fila tiene contenido
-        if datos:
-            datos_tabla.append(datos)
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, datos in enumerate(filas):
+            logger.debug("Fila %s: %s", i + 1, datos)
 
-    return datos_tabla
+    return filas
 
 
 def get_final_headers(driver, tabla_id):
@@ -216,36 +418,124 @@ def get_final_headers(driver, tabla_id):
     los niveles inferiores cuando hay agrupación.
     """
     try:
-        tabla = driver.find_element(By.ID, tabla_id)
-        fila_superior = tabla.find_elements(By.XPATH, ".//tr[1]/td | .//tr[1]/th")
-        fila_inferior = tabla.find_elements(By.XPATH, ".//tr[2]/td | .//tr[2]/th")
+        # Obtener [texto, colspan] de las dos filas de encabezado en una sola llamada.
+        # Se usa innerText (no textContent): respeta los <br> y omite texto oculto,
+        # y los nombres de columna alimentan la salida y c_cleaner.py
+        fila_superior, fila_inferior = driver.execute_script(
+            """
+            const tabla = document.getElementById(arguments[0]);
+            const celdas = (n) => Array.from(
+                tabla.querySelectorAll(`tr:nth-of-type(${n}) > td, tr:nth-of-type(${n}) > th`)
+            ).map(c => [c.innerText.replace(/\\s+/g, ' ').trim(), c.getAttribute('colspan')]);
+            return [celdas(1), celdas(2)];
+            """,
+            tabla_id,
+        )
 
         encabezados = []
         idx_inferior = 0  # Índice para recorrer fila_inferior cuando haya agrupación
 
-        for i, celda in enumerate(fila_superior):
+        for i, (texto, colspan) in enumerate(fila_superior):
             # Omitir la primera celda si está vacía (botón)
-            if i == 0 and not celda.text.strip():
+            if i == 0 and not texto:
                 continue
 
-            colspan = celda.get_attribute("colspan")
-
             if colspan:  # Si hay agrupación, tomar encabezados del nivel inferior
                 for _ in range(int(colspan)):
-                    encabezados.append(fila_inferior[idx_inferior].text.strip())
+                    encabezados.append(fila_inferior[idx_inferior][0])
                     idx_inferior += 1
             else:  # Si no hay agrupación, tomar el texto directamente
-                encabezados.append(celda.text.strip())
+                encabezados.append(texto)
 
-        print(f"Encabezados extraídos: {encabezados}")
+        logger.debug("Encabezados extraídos: %s", encabezados)
         return encabezados
 
     except Exception as e:
-        print(f"Error al obtener encabezados: {e}")
+        logger.error("Error al obtener encabezados: %s", e)
         return []
 
 
-def navigate_levels(driver, route_config, current_level, table_headers, context=None):
+def get_level_items(driver, list_xpath, name_xpath):
+    """
+    Obtiene en una sola llamada (execute_script) los elementos de un nivel
+    y retorna una lista de tuplas (id, nombre).
+    """
+    items = driver.execute_script(
+        """
+        const filas = document.evaluate(
+            arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+        );
+        const items = [];
+        for (let i = 0; i < filas.snapshotLength; i++) {
+            const fila = filas.snapshotItem(i);
+            const celda = document.evaluate(
+                arguments[1], fila, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+            ).singleNodeValue;
+            items.push({id: fila.id, name: celda ? celda.textContent.replace(/\\s+/g, ' ').trim() : ""});
+        }
+        return items;
+        """,
+        list_xpath,
+        name_xpath,
+    )
+    return [(item["id"], item["name"]) for item in items]
+
+
+def go_back(driver, list_xpath, tiempo=10):
+    """
+    Regresa al nivel anterior del historial y espera explícitamente
+    a que la lista del nivel padre esté presente.
+    """
+    # Referencia a la página actual para detectar cuándo fue reemplazada
+    pagina_actual = driver.find_element(By.TAG_NAME, "html")
+
+    driver.execute_script("history.go(-1);")
+    _wait(driver, tiempo).until(EC.staleness_of(pagina_actual))
+    driver._current_frame = None  # La página cambió: invalidar el frame actual
+
+    switch_to_frame(driver, a_config.GLOBAL_SELECTORS["main_frame"])
+    _wait(driver, tiempo).until(
+        EC.presence_of_element_located((By.XPATH, list_xpath))
+    )
+
+
+def page_changed(pagina):
+    """
+    Indica si la página (su elemento <html>) fue reemplazada por una navegación.
+    """
+    try:
+        pagina.is_enabled()
+        return False
+    except StaleElementReferenceException:
+        return True
+
+
+def resync_level(driver, list_xpath, regresar=False, tiempo=10):
+    """
+    Re-sincroniza el driver con la lista del nivel tras un error: regresa
+    un paso en el historial si la página cambió durante el intento, vuelve a
+    entrar al frame principal y espera a que la lista esté presente.
+    """
+    if regresar:
+        try:
+            go_back(driver, list_xpath, tiempo)
+            return
+        except (StaleElementReferenceException, TimeoutException) as e:
+            logger.warning("⚠️ No se pudo regresar al nivel: %s", e)
+
+    driver._current_frame = None
+    switch_to_frame(driver, a_config.GLOBAL_SELECTORS["main_frame"])
+    try:
+        _wait(driver, tiempo).until(
+            EC.presence_of_element_located((By.XPATH, list_xpath))
+        )
+    except TimeoutException:
+        logger.warning("⚠️ No se encontró la lista del nivel: %s", list_xpath)
+
+
+def navigate_levels(
+    driver, route_config, current_level, table_headers, context=None, route_name=None
+):
     """
     Navega a través de los niveles definidos en la configuración.
     (Versión corregida para manejar StaleElementReferenceException)
@@ -256,7 +546,10 @@ def navigate_levels(driver, route_config, current_level, table_headers, context=
     if context is None:
         context = {}
 
-    print(f"\n📌 Entrando a nivel: {current_level}")
+    if STOP_EVENT.is_set():
+        return extracted_data
+
+    logger.debug("📌 Entrando a nivel: %s", current_level)
 
     level_config = route_config["levels"][current_level]
     button = level_config.get("button")
@@ -266,92 +559,114 @@ def navigate_levels(driver, route_config, current_level, table_headers, context=
     table_id = level_config.get("table_id")
 
     if button:
-        print(f"🔘 Haciendo clic en botón: {button}")
+        logger.debug("🔘 Haciendo clic en botón: %s", button)
         click_on_element(driver, button)
         switch_to_frame(driver, a_config.GLOBAL_SELECTORS["main_frame"])
 
     if list_xpath:
-        # --- CAMBIO 1: Obtener el número de elementos ANTES de iterar ---
-        # Esto nos da un número fijo de iteraciones y evita problemas si la lista cambia.
+        # Obtener (id, nombre) de todos los elementos del nivel en una sola llamada.
+        # Los IDs ('tr0', 'tr1', ...) se mantienen al regresar al nivel.
         try:
-            initial_elements = WebDriverWait(driver, 10).until(
+            _wait(driver, 10).until(
                 EC.presence_of_all_elements_located((By.XPATH, list_xpath))
             )
-            num_elements = len(initial_elements)
-            print(f"📋 Se encontraron {num_elements} elementos en {current_level}")
+            level_items = get_level_items(driver, list_xpath, name_xpath)
+            logger.debug("📋 Se encontraron %s elementos en %s", len(level_items), current_level)
         except TimeoutException:
-            print(f"⚠️ No se encontraron elementos con el XPath: {list_xpath}. Saliendo del nivel.")
-            num_elements = 0
-
-
-        for i in range(num_elements):
-            # --- CAMBIO 2: Re-localizar la lista completa DENTRO de cada iteración ---
-            # Esto es crucial. Después de `driver.back()`, la lista anterior es inválida.
-            # Necesitamos obtener la lista "fresca" cada vez.
-            elements = driver.find_elements(By.XPATH, list_xpath)
-            
-            # --- CAMBIO 3: Asegurarse de que el índice todavía sea válido ---
-            if i >= len(elements):
-                print(f"Advertencia: La lista de elementos cambió. Omitiendo la iteración {i}.")
-                continue
-
-            element = elements[i]
-            
-            # --- CAMBIO 4: Interactuar con el elemento inmediatamente después de encontrarlo ---
-            try:
-                element_name = element.find_element(By.XPATH, name_xpath).text.strip()
-                context[current_level] = element_name
-                print(f"➡️ Entrando en: {element_name} (Elemento {i+1}/{num_elements})")
-
-                # Tu función `click_on_element` ya busca el ID, lo cual es robusto.
-                # El ID 'tr' + índice 'i' parece ser el patrón de la página.
-                click_on_element(driver, f"tr{i}")
-                switch_to_frame(driver, a_config.GLOBAL_SELECTORS["main_frame"])
-
-                if next_level:
-                    print(f"🔽 Navegando al siguiente nivel: {next_level}")
-                    extracted_data.extend(
-                        navigate_levels(
-                            driver, route_config, next_level, table_headers, context
+            logger.warning("⚠️ No se encontraron elementos con el XPath: %s. Saliendo del nivel.", list_xpath)
+            level_items = []
+
+        num_elements = len(level_items)
+
+        for i, (tr_id, element_name) in enumerate(level_items):
+            if STOP_EVENT.is_set():
+                break
+
+            context[current_level] = element_name
+            logger.debug("➡️ Entrando en: %s (Elemento %s/%s)", element_name, i + 1, num_elements)
+
+            # Se reintenta el elemento una vez; los datos solo se agregan si
+            # el elemento se completó, para no duplicar filas al reintentar
+            for intento in range(2):
+                # Hacer clic en una fila solo la selecciona; la navegación ocurre con
+                # el botón del siguiente nivel. Para saber si hay que regresar tras
+                # un error se verifica si la página del nivel fue reemplazada.
+                pagina_nivel = driver.find_element(By.TAG_NAME, "html")
+                try:
+                    # click_on_element re-localiza el elemento por ID si queda obsoleto
+                    click_on_element(driver, tr_id)
+                    switch_to(driver, a_config.GLOBAL_SELECTORS["main_frame"])
+
+                    datos_item = []
+                    if next_level:
+                        logger.debug("🔽 Navegando al siguiente nivel: %s", next_level)
+                        datos_item = navigate_levels(
+                            driver,
+                            route_config,
+                            next_level,
+                            table_headers,
+                            context,
+                            route_name,
                         )
+                    break
+
+                except (StaleElementReferenceException, TimeoutException) as e:
+                    logger.warning(
+                        "⚠️ %s en la iteración %s (intento %s/2): %s",
+                        type(e).__name__, i, intento + 1, e,
                     )
+                    resync_level(driver, list_xpath, regresar=page_changed(pagina_nivel))
+            else:
+                logger.error("Omitiendo '%s' después de 2 intentos.", element_name)
+                continue
 
-                print(f"⬅️ Regresando a {current_level}")
-                driver.back()
-                # Pequeña pausa opcional para dar tiempo a que el DOM se estabilice
-                time.sleep(0.5) 
-                switch_to_frame(driver, a_config.GLOBAL_SELECTORS["main_frame"])
+            extracted_data.extend(datos_item)
 
-            except StaleElementReferenceException:
-                print(f"⚠️ Ocurrió un StaleElementReferenceException en la iteración {i}. Reintentando una vez...")
-                # Agregamos un reintento simple para esta iteración específica.
-                continue # Esto hará que el bucle 'for' continúe con el siguiente 'i'.
-                         # Si el problema persiste, podrías implementar una lógica de reintento más compleja.
+            logger.debug("⬅️ Regresando a %s", current_level)
+            try:
+                go_back(driver, list_xpath)
+            except (StaleElementReferenceException, TimeoutException) as e:
+                logger.warning("⚠️ No se pudo regresar a %s: %s", current_level, e)
+                resync_level(driver, list_xpath)
 
 
     else:
         # Lógica para cuando no hay una lista para iterar (sin cambios)
         if next_level:
-            print(f"⏭️ Saltando a siguiente nivel: {next_level}")
+            logger.debug("⏭️ Saltando a siguiente nivel: %s", next_level)
             extracted_data.extend(
                 navigate_levels(
-                    driver, route_config, next_level, table_headers, context
+                    driver,
+                    route_config,
+                    next_level,
+                    table_headers,
+                    context,
+                    route_name,
                 )
             )
         else:
             if table_id:
-                if not table_headers:
-                    print("📌 Extrayendo encabezados de la tabla...")
-                    table_headers.extend(get_final_headers(driver, table_id))
-
-                print(f"📊 Extrayendo datos de la tabla: {table_id}")
-                table_data = extract_table_data(driver)
-
-                for row in table_data:
-                    formatted_row = [context[level] for level in context.keys()] + row
-                    extracted_data.append(formatted_row)
+                # Una sola sección crítica: solo la primera hoja de cada
+                # (ruta, tabla) lee los encabezados de la página
+                cache_key = (route_name, table_id)
+                with HEADERS_LOCK:
+                    encabezados = HEADERS_CACHE.get(cache_key)
+                    if encabezados is None:
+                        logger.debug("📌 Extrayendo encabezados de la tabla...")
+                        encabezados = get_final_headers(driver, table_id)
+                        if encabezados:
+                            HEADERS_CACHE[cache_key] = encabezados
+
+                    if not table_headers:
+                        table_headers.extend(encabezados)
+
+                logger.debug("📊 Extrayendo datos de la tabla: %s", table_id)
+                # El contexto es el mismo para todas las filas: se antepone en el navegador
+                extracted_data.extend(
+                    extract_table_data(driver, tuple(context.values()))
+                )
 
-    print(f"✅ Saliendo de nivel: {current_level}")
+    logger.debug("✅ Saliendo de nivel: %s", current_level)
     return extracted_data
 
 def extract_data_by_year(driver, year, route_name, table_headers):
@@ -374,29 +689,143 @@ def extract_data_by_year(driver, year, route_name, table_headers):
     # Obtener la configuración de la ruta
     route_config = a_config.ROUTES[route_name]
 
-    # Determinar el primer nivel dinámicamente
-    first_level = min(
-        route_config["levels"].keys(), key=lambda lvl: int(lvl.split("_")[1])
-    )
+    # Primer nivel precalculado en a_config
+    first_level = route_config["_first_level"]
 
     # Navegar a través de los niveles desde el primer nivel
-    datos_extraidos = navigate_levels(driver, route_config, first_level, table_headers)
+    datos_extraidos = navigate_levels(
+        driver, route_config, first_level, table_headers, route_name=route_name
+    )
 
     # Agregar metadatos: Año...
     for fila in datos_extraidos:
-        fila_con_meta = [year] + fila
-        datos_anio.append(fila_con_meta)
+        datos_anio.append((year, *fila))
 
     print("✅ Extracción completada")
     return datos_anio
 
 
-def save_data(nombre_archivo, datos, encabezados):
+class ParquetSink:
     """
-    Guarda los datos extraídos en un archivo Excel.
+    Escribe los datos por lotes (un lote por año) en un archivo Parquet
+    a medida que se extraen. Es seguro usarlo desde varios hilos.
+    El archivo se abre recién cuando se conocen los encabezados de la tabla;
+    mientras tanto los lotes quedan en memoria.
+    """
+
+    def __init__(self, nombre_archivo, encabezados_base, table_headers):
+        self.nombre_archivo = nombre_archivo
+        self.encabezados_base = encabezados_base
+        self.table_headers = table_headers  # Lista compartida, se completa al extraer
+        self.writer = None
+        self.pendientes = []  # Lotes recibidos antes de conocer los encabezados
+        self.filas = 0
+        self.lock = threading.Lock()
+
+    def write(self, datos):
+        """
+        Agrega un lote de filas al archivo Parquet.
+        """
+        if not datos:
+            return
+
+        with self.lock:
+            if self.writer is None:
+                if not self.table_headers:
+                    # Sin encabezados aún: no fijar un esquema que descarte columnas
+                    logger.warning(
+                        "⚠️ Encabezados no disponibles; %s filas quedan en espera.", len(datos)
+                    )
+                    self.pendientes.append(datos)
+                    return
+
+                self._open(self.encabezados_base + list(self.table_headers))
+
+            self._write_batch(datos)
+
+    def _open(self, encabezados):
+        """
+        Abre el archivo Parquet ('Año' entero y el resto texto) y escribe
+        los lotes que estaban en espera.
+        """
+        schema = pa.schema(
+            [
+                (nombre, pa.int64() if nombre == "Año" else pa.string())
+                for nombre in encabezados
+            ]
+        )
+        self.writer = pq.ParquetWriter(self.nombre_archivo, schema)
+
+        pendientes, self.pendientes = self.pendientes, []
+        for lote in pendientes:
+            self._write_batch(lote)
+
+    def _write_batch(self, datos):
+        """
+        Escribe un lote con el esquema del archivo ya abierto.
+        """
+        schema = self.writer.schema
+        num_columnas = len(schema)
+
+        # Completar con None las filas cortas (como hacía pd.DataFrame)
+        # y recortar las que traen columnas de más
+        filas = []
+        for fila in datos:
+            if len(fila) > num_columnas:
+                logger.warning(
+                    "⚠️ Fila con %s columnas (se esperaban %s), se recorta: %s",
+                    len(fila), num_columnas, fila,
+                )
+            filas.append(tuple(fila[:num_columnas]) + (None,) * (num_columnas - len(fila)))
+
+        try:
+            tabla = pa.Table.from_arrays(
+                [
+                    pa.array(columna, type=campo.type)
+                    for columna, campo in zip(zip(*filas), schema)
+                ],
+                schema=schema,
+            )
+            self.writer.write_table(tabla)
+            self.filas += len(filas)
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            # No detener el worker: se registra el error y se continúa con el siguiente lote
+            logger.error("Error al escribir %s filas en Parquet: %s", len(filas), e)
+
+    def close(self):
+        """
+        Cierra el archivo Parquet. Si nunca se obtuvieron los encabezados,
+        guarda los lotes en espera con nombres de columna genéricos.
+        """
+        with self.lock:
+            if self.writer is None and self.pendientes:
+                ancho = max(len(fila) for lote in self.pendientes for fila in lote)
+                num_base = len(self.encabezados_base)
+                encabezados = self.encabezados_base + [
+                    f"Columna_{i + 1}" for i in range(ancho - num_base)
+                ]
+                logger.error(
+                    "No se obtuvieron los encabezados de la tabla; se usan nombres genéricos: %s",
+                    encabezados,
+                )
+                print("⚠️ No se obtuvieron los encabezados; se guardan con nombres genéricos.")
+                self._open(encabezados)
+
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+
+
+def save_data(nombre_archivo, archivo_parquet):
+    """
+    Exporta a un archivo Excel los datos guardados en el archivo Parquet,
+    ordenados por año.
     """
     try:
-        df = pd.DataFrame(datos, columns=encabezados)
+        # ParquetFile.read() admite nombres de columna duplicados (pd.read_parquet no)
+        df = pq.ParquetFile(archivo_parquet).read().to_pandas()
+        # Ordenar por la primera columna (Año) por posición, válido aun con duplicados
+        df = df.iloc[df.iloc[:, 0].argsort(kind="stable")]
         df.to_excel(nombre_archivo, index=False)
         print(f"Datos guardados correctamente en {nombre_archivo}")
     except Exception as e:
@@ -424,60 +853,114 @@ def select_route():
             print("⚠️ Entrada inválida, ingresa un número.")
 
 
+def scrape_years(worker_id, years, route_name, table_headers, sink):
+    """
+    Extrae los datos de un grupo de años con un driver propio.
+    Cada año se escribe en 'sink' apenas se completa.
+    Se detiene entre años y niveles si se activa STOP_EVENT.
+    """
+    if STOP_EVENT.is_set():
+        return
+
+    driver = initialize_driver(worker_id)
+    try:
+        navigate_to_url(driver, a_config.URL)
+
+        for year in years:
+            if STOP_EVENT.is_set():
+                break
+
+            datos_anio = extract_data_by_year(driver, year, route_name, table_headers)
+
+            # Un año interrumpido queda incompleto: no se guarda
+            if STOP_EVENT.is_set():
+                print(f"⏹️ Año {year} interrumpido, no se guarda.")
+                break
+
+            sink.write(datos_anio)
+    finally:
+        close_driver(driver)
+
+
 def main():
     """
     Función principal para iniciar el proceso de scraping con selección de ruta.
+    Los años se reparten entre varios drivers que se ejecutan en paralelo y
+    se escriben en un archivo Parquet a medida que se completan.
     Guarda los datos recolectados incluso si ocurre un error.
     """
-    driver = initialize_driver()
-    todos_los_datos = []
     table_headers = []
+    hubo_error = False
+    STOP_EVENT.clear()
 
-    try:
-        navigate_to_url(driver, a_config.URL)
+    ruta_seleccionada = select_route()
+    print(f"\n🔍 Iniciando scraping para la ruta: {ruta_seleccionada}")
 
-        ruta_seleccionada = select_route()
-        print(f"\n🔍 Iniciando scraping para la ruta: {ruta_seleccionada}")
+    # Obtener configuración de la ruta seleccionada
+    file_conf = a_config.FILE_CONFIGS.get(ruta_seleccionada, {})
+    encabezados_base = file_conf.get("ENCABEZADOS_BASE", [])
+    archivo_scraping = file_conf.get("ARCHIVO_SCRAPING", [])
 
-        # Obtener configuración de la ruta seleccionada
-        file_conf = a_config.FILE_CONFIGS.get(ruta_seleccionada, {})
-        encabezados_base = file_conf.get("ENCABEZADOS_BASE", [])
-        archivo_scraping = file_conf.get("ARCHIVO_SCRAPING", [])
+    # Los datos se escriben en Parquet; el Excel se genera al final a partir de él
+    archivo_parquet = os.path.join(
+        a_config.PATH_DATA_RAW, os.path.splitext(archivo_scraping)[0] + ".parquet"
+    )
+    sink = ParquetSink(archivo_parquet, encabezados_base, table_headers)
 
-        # Iterar sobre los años y extraer datos
-        for year in a_config.YEARS:
-            datos_anio = extract_data_by_year(
-                driver, year, ruta_seleccionada, table_headers
-            )
+    # Repartir los años entre los drivers disponibles
+    num_workers = max(1, min(a_config.MAX_WORKERS, len(a_config.YEARS)))
+    grupos_years = [a_config.YEARS[i::num_workers] for i in range(num_workers)]
 
-            todos_los_datos.extend(datos_anio)
+    executor = ThreadPoolExecutor(max_workers=num_workers)
+    try:
+        futures = {
+            executor.submit(
+                scrape_years,
+                worker_id,
+                years,
+                ruta_seleccionada,
+                table_headers,
+                sink,
+            ): years
+            for worker_id, years in enumerate(grupos_years)
+        }
+
+        for future in as_completed(futures):
+            try:
+                future.result()
+                print(f"✅ Años completados: {futures[future]}")
+            except Exception as e:
+                hubo_error = True
+                print(f"Se produjo un error inesperado en los años {futures[future]}: {e}")
+
+    except KeyboardInterrupt:
+        # Avisar a los workers que se detengan; cada uno cierra su driver al salir
+        print("⏹️ Interrupción recibida, deteniendo los workers...")
+        STOP_EVENT.set()
+        hubo_error = True
 
-    except Exception as e:
-        print(f"Se produjo un error inesperado: {e}")
+    finally:
+        # Cancelar los workers pendientes y esperar a que los activos cierren su driver
+        executor.shutdown(wait=True, cancel_futures=True)
+        sink.close()
 
         # Guardar datos parciales si hubo un error
-        if todos_los_datos:
+        if hubo_error and sink.filas:
             print("💾 Guardando datos parciales antes de cerrar...")
-            encabezados_completos = encabezados_base + table_headers
             save_data(
                 os.path.join(a_config.PATH_DATA_RAW, "parcial_" + archivo_scraping),
-                todos_los_datos,
-                encabezados_completos,
+                archivo_parquet,
             )
 
-    finally:
         # Guardar los datos finales si se obtuvieron datos completos
-        if todos_los_datos:
+        if sink.filas:
             print("💾 Guardando datos finales...")
-            encabezados_completos = encabezados_base + table_headers
             save_data(
                 os.path.join(a_config.PATH_DATA_RAW, archivo_scraping),
-                todos_los_datos,
-                encabezados_completos,
+                archivo_parquet,
             )
 
-        driver.quit()
-        print("✅ Proceso finalizado, driver cerrado.")
+        print("✅ Proceso finalizado, drivers cerrados.")
 
 
 if __name__ == "__main__":